@@ -9,6 +9,7 @@ import math
 import copy
 import logging
 import numpy as np
+import scipy.linalg
 
 import rmgpy.constants as constants
 
@@ -146,12 +147,8 @@ def diagonalize_projected_hessian(conformer, hessian, linear, n_vib, rotors=[],
     # Generate mass-weighted force constant matrix
     # This converts the axes to mass-weighted Cartesian axes
     # Units of Fm are J/m^2*kg = 1/s^2
-    weighted_hessian = hessian.copy()
-    for i in range(n_atoms):
-        for j in range(n_atoms):
-            for u in range(3):
-                for v in range(3):
-                    weighted_hessian[3 * i + u, 3 * j + v] /= math.sqrt(mass[i] * mass[j])
+    inv_sqrt_mass_3N = 1.0 / np.sqrt(np.repeat(mass, 3))
+    weighted_hessian = hessian * np.outer(inv_sqrt_mass_3N, inv_sqrt_mass_3N)
 
     hessian_int = np.dot(T.T, np.dot(weighted_hessian, T))
 
@@ -265,16 +262,14 @@ def diagonalize_projected_hessian(conformer, hessian, linear, n_vib, rotors=[],
     # For linear molecule
     # TODO It seems that the above code cannot handle linear molecules properly
     if linear:
-        mass_3N_array = np.array([i for i in mass for j in range(3)])
-        mass_mat = np.diag(mass_3N_array)
-        inv_sq_mass_mat = np.linalg.inv(mass_mat ** 0.5)
-        fm = inv_sq_mass_mat.dot(hessian.dot(inv_sq_mass_mat))
+        fm = weighted_hessian
 
     if get_mass_weighted_hessian:
         return fm
 
     # Get eigenvalues of mass-weighted force constant matrix
-    eig, v = np.linalg.eigh(fm)
+    # fm is not used afterwards, so LAPACK's RRR driver is allowed to overwrite it
+    eig, v = scipy.linalg.eigh(fm, overwrite_a=True, driver='evr')
     eig.sort()
 
     if get_weighted_vectors:
@@ -293,10 +288,7 @@ def diagonalize_projected_hessian(conformer, hessian, linear, n_vib, rotors=[],
     vib_freq = np.sqrt(eig[-n_vib:]) / (2 * np.pi * constants.c * 100)
 
     # Transforme directional vectors of normal modes from mass-weighted coordinates into cartesian coordinates
-    mass_3N_array = np.array([i for i in mass for j in range(3)])
-    mass_mat = np.diag(mass_3N_array)
-    inv_sq_mass_mat = np.linalg.inv(mass_mat ** 0.5)
-    unweighted_v = np.matmul(inv_sq_mass_mat, v).T[-n_vib:]
+    unweighted_v = (inv_sqrt_mass_3N[:, np.newaxis] * v).T[-n_vib:]
     return vib_freq, unweighted_v
 
 def get_internal_rotation_freq(conformer, hessian, target_rotor, rotors, linear, n_vib, is_QM_MM_INTERFACE=False, label=None):
@@ -305,10 +297,29 @@ def get_internal_rotation_freq(conformer, hessian, target_rotor, rotors, linear,
     logging.info('The vibrational frequency of internal rotation whose pivot is {pivot} is {freq:.2f} cm^-1'.format(pivot=target_rotor[0], freq=internal_rotation_freq))
     return internal_rotation_freq
 
+def get_vibrational_mode_vectors(vib_freq, unweighted_v, B, n_dummy_atoms=0, step_size_factor=1):
+    """
+    For the vibrational frequencies `vib_freq` in cm^-1 and the directional vectors `unweighted_v`
+    in cartesian coordinates, determine the reduced masses (in amu), the sampling step sizes
+    (in angstrom), and the normalized directional vectors in internal coordinates, which are
+    returned as the columns of a 2-D array. `n_dummy_atoms` capping atoms added to the internal
+    coordinates are given a zero displacement, and `B` is the Wilson B-matrix.
+    """
+    vib_freq = np.asarray(vib_freq)
+    unweighted_v = np.asarray(unweighted_v)
+    magnitudes = np.linalg.norm(unweighted_v, axis=1)
+    reduced_masses = magnitudes ** -2 / constants.amu # in amu
+    step_sizes = np.sqrt(constants.hbar / (reduced_masses * constants.amu) / (vib_freq * 2 * np.pi * constants.c * 100)) * 10 ** 10 * step_size_factor # in angstrom
+    normalized_vectors = unweighted_v / magnitudes[:, np.newaxis]
+    if n_dummy_atoms:
+        normalized_vectors = np.hstack((normalized_vectors, np.zeros((normalized_vectors.shape[0], 3 * n_dummy_atoms))))
+    qj_all = np.dot(B, normalized_vectors.T)
+    return reduced_masses, step_sizes, qj_all
+
 def sampling_along_torsion(symbols, cart_coords, mode, internal_object, conformer, int_freq, rotors_dict, scan_res, 
                            path, ncpus, charge=None, multiplicity=None, rem_variables_dict=None, gen_basis="", 
                            is_QM_MM_INTERFACE=None, QM_USER_CONNECT=None, QM_ATOMS=None, force_field_params=None, 
-                           fixed_molecule_string=None, opt=None, number_of_fixed_atoms=None, label=None):
+                           fixed_molecule_string=None, opt=None, number_of_fixed_atoms=None, label=None, symmetry_number=None):
     logging.info('Sampling Mode {}'.format(mode))
     XyzDictOfEachMode = {}
     EnergyDictOfEachMode = {}
@@ -343,8 +354,20 @@ def sampling_along_torsion(symbols, cart_coords, mode, internal_object, conforme
         qk *= -1
 
     # Start to sample 1-D PES
-    logging.info('direction = 1')
+    logging.info('Mode {}: direction = 1'.format(mode))
     nsample = int(360 / scan_res) + 1
+
+    # If the symmetry number of this rotor is known in advance, only the first period of the scan is calculated
+    period = None
+    if symmetry_number is not None and symmetry_number > 1:
+        # A period of the scan has to be a whole number of steps of exactly 360 / symmetry_number degrees
+        if 360 % (scan_res * symmetry_number) == 0:
+            period = int(360 // (scan_res * symmetry_number))
+        else:
+            logging.warning('The scan of mode {} cannot be divided into {} equivalent periods with a resolution of {} degrees. '
+                            'The full scan is calculated.'.format(mode, symmetry_number, scan_res))
+            symmetry_number = None
+
     initial_geometry = cart_coords.copy()
     cart_coords = initial_geometry.copy()
     fail_in_torsion_sampling = False
@@ -353,7 +376,10 @@ def sampling_along_torsion(symbols, cart_coords, mode, internal_object, conforme
         file_name = 'tors_{}_{}'.format(mode, sample)
 
         # Calculate electronic energy of each sampling point, and save the result
-        if is_QM_MM_INTERFACE:
+        if period is not None and sample >= period:
+            # This point is equivalent by symmetry to one in the first period
+            e_elec = min_elect + EnergyDictOfEachMode[sample % period]
+        elif is_QM_MM_INTERFACE:
             e_elec = get_electronic_energy(xyz, path, file_name, ncpus, charge, multiplicity, rem_variables_dict, 
                                            gen_basis, is_QM_MM_INTERFACE, QM_USER_CONNECT, QM_ATOMS, force_field_params, 
                                            fixed_molecule_string, opt, number_of_fixed_atoms)
@@ -366,7 +392,7 @@ def sampling_along_torsion(symbols, cart_coords, mode, internal_object, conforme
             EnergyDictOfEachMode[sample] = 0
             min_elect = e_elec
         else:
-            logging.info('ngrid = {}'.format(sample))
+            logging.info('Mode {}: ngrid = {}'.format(mode, sample))
             EnergyDictOfEachMode[sample] = e_elec - min_elect
         
         # Update cartesian coordinate of each sampling point
@@ -374,8 +400,9 @@ def sampling_along_torsion(symbols, cart_coords, mode, internal_object, conforme
     
     # Determine the symmetry number of this internal rotation, and save the result
     if fail_in_torsion_sampling is False:
-        v_list = [i * (constants.E_h * constants.Na) for i in EnergyDictOfEachMode.values()] # in J/mol
-        symmetry_number = determine_rotor_symmetry(v_list, label, pivots)
+        if symmetry_number is None:
+            v_list = [i * (constants.E_h * constants.Na) for i in EnergyDictOfEachMode.values()] # in J/mol
+            symmetry_number = determine_rotor_symmetry(v_list, label, pivots)
         # symmetry_number = 3
         logging.info('\n')
         ModeDictOfEachMode['symmetry_number'] = symmetry_number
@@ -406,7 +433,7 @@ def sampling_along_vibration(symbols, cart_coords, mode, internal_object, intern
     internal = copy.deepcopy(internal_object)
 
     # Sample points in positive direction
-    logging.info('direction = 1')
+    logging.info('Mode {}: direction = 1'.format(mode))
     sample = 0
     while True:
         xyz = getXYZ(symbols, cart_coords)
@@ -455,11 +482,11 @@ def sampling_along_vibration(symbols, cart_coords, mode, internal_object, intern
             break
         
         # Update cartesian coordinate of each sampling point
-        logging.info('ngrid = {}'.format(sample))
+        logging.info('Mode {}: ngrid = {}'.format(mode, sample))
         cart_coords += internal.transform_int_step((qj * step_size).reshape(-1,))
     
     # Sample points in negative direction
-    logging.info('direction = -1')
+    logging.info('Mode {}: direction = -1'.format(mode))
     cart_coords = initial_geometry.copy()
     internal = copy.deepcopy(internal_object)  
     cart_coords += internal.transform_int_step((-qj * step_size).reshape(-1,))
@@ -506,7 +533,7 @@ def sampling_along_vibration(symbols, cart_coords, mode, internal_object, intern
             break
         
         # Update cartesian coordinate of each sampling point
-        logging.info('ngrid = {}'.format(sample))
+        logging.info('Mode {}: ngrid = {}'.format(mode, sample))
         cart_coords += internal.transform_int_step((-qj * step_size).reshape(-1,))
 
     return XyzDictOfEachMode, EnergyDictOfEachMode, ModeDictOfEachMode, min_elect
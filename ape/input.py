@@ -7,6 +7,7 @@ This module contains functionality for parsing APE input files.
 
 import logging
 import os.path
+from functools import lru_cache
 
 import numpy as np
 
@@ -19,8 +20,7 @@ from rmgpy.statmech.translation import IdealGasTranslation
 from rmgpy.statmech.vibration import HarmonicOscillator
 
 from ape.species import Species, TransitionState
-from ape.sampling import SamplingJob
-from ape.qchem import QChemLog
+from ape.sampling import SamplingJob, load_conformer, load_qchem
 from ape.thermo import ThermoJob
 from ape.reaction import Reaction
 from ape.kinetics import KineticsJob
@@ -31,12 +31,13 @@ from ape.job.inputs import rem_variable_list
 
 species_dict, transition_state_dict, reaction_dict = dict(), dict(), dict()
 job_list = list()
+sampling_job_by_label = dict()
 directory, output_directory = str(), str()
 
 
 def species(label, *args, **kwargs):
     """Load a species from an input file"""
-    global species_dict, job_list, directory
+    global species_dict, job_list, sampling_job_by_label, directory
     if label in species_dict:
         raise ValueError('Multiple occurrences of species with label {0!r}.'.format(label))
     logging.info('Loading species {0}...'.format(label))
@@ -50,9 +51,10 @@ def species(label, *args, **kwargs):
         path = os.path.join(directory, args[0])
         spec.path = path
         job = SamplingJob(label=label, input_file=path, output_directory=output_directory)
-        spec.conformer, unscaled_frequencies = QChemLog(path).load_conformer()
+        spec.conformer = load_conformer(path)
         logging.debug('Added species {0} to a sampling job.'.format(label))
         job_list.append(job)
+        sampling_job_by_label[label] = job
     elif len(args) > 1:
         raise InputError('species {0} can only have two non-keyword argument '
                          'which should be the species label and the '
@@ -60,27 +62,14 @@ def species(label, *args, **kwargs):
 
     if len(kwargs) > 0:
         # The species parameters are given explicitly
-        protocol = 'UMVT'
-        E0 = None
-        multiplicity = None
-        charge = None
-        rotors = None
-        imaginary_bonds = None
-        for key, value in kwargs.items():
-            if key == 'protocol':
-                protocol = value.upper()
-            elif key == 'E0':
-                E0 = value
-            elif key == 'multiplicity':
-                multiplicity = value
-            elif key == 'charge':
-                charge = value
-            elif key == 'rotors':
-                rotors = value
-            elif key == 'imaginary_bonds':
-                imaginary_bonds = value
-            else:
-                raise TypeError('species() got an unexpected keyword argument {0!r}.'.format(key))
+        protocol = kwargs.pop('protocol', 'UMVT').upper()
+        E0 = kwargs.pop('E0', None)
+        multiplicity = kwargs.pop('multiplicity', None)
+        charge = kwargs.pop('charge', None)
+        rotors = kwargs.pop('rotors', None)
+        imaginary_bonds = kwargs.pop('imaginary_bonds', None)
+        if kwargs:
+            raise TypeError('species() got unexpected keyword arguments {0!r}.'.format(list(kwargs)))
 
         spec.conformer.E0 = E0
 
@@ -106,31 +95,36 @@ def transitionState(label, *args, **kwargs):
         path = os.path.join(directory, args[0])
         ts.path = path
         job = SamplingJob(label=label, input_file=path, output_directory=output_directory, is_ts=True)
-        Log = QChemLog(path)
-        ts.conformer, unscaled_frequencies = Log.load_conformer()
-        ts.frequency = (Log.load_negative_frequency(), "cm^-1")
+        ts.conformer = load_conformer(path)
+        ts.frequency = (load_qchem(path).load_negative_frequency(), "cm^-1")
         job_list.append(job)
 
+        if len(kwargs) > 0:
+            # The sampling parameters are given explicitly
+            protocol = kwargs.pop('protocol', 'UMVT').upper()
+            E0 = kwargs.pop('E0', None)
+            rotors = kwargs.pop('rotors', None)
+            imaginary_bonds = kwargs.pop('imaginary_bonds', None)
+            if kwargs:
+                raise TypeError('transitionState() got unexpected keyword arguments {0!r}.'.format(list(kwargs)))
+
+            if protocol == 'UMVT' and rotors is None:
+                raise InputError('If the transition state is sampled by using UMVT algorithm, the rotors are needed to be specified.')
+
+            job.protocol = protocol
+            ts.conformer.E0 = E0
+            job.rotors = rotors
+            job.imaginary_bonds = imaginary_bonds
+
     elif len(args) == 0:
         # The species parameters are given explicitly
-        E0 = None
-        modes = []
-        spin_multiplicity = 1
-        optical_isomers = 1
-        frequency = None
-        for key, value in kwargs.items():
-            if key == 'E0':
-                E0 = value
-            elif key == 'modes':
-                modes = value
-            elif key == 'spinMultiplicity':
-                spin_multiplicity = value
-            elif key == 'opticalIsomers':
-                optical_isomers = value
-            elif key == 'frequency':
-                frequency = value
-            else:
-                raise TypeError('transition_state() got an unexpected keyword argument {0!r}.'.format(key))
+        E0 = kwargs.pop('E0', None)
+        modes = kwargs.pop('modes', [])
+        spin_multiplicity = kwargs.pop('spinMultiplicity', 1)
+        optical_isomers = kwargs.pop('opticalIsomers', 1)
+        frequency = kwargs.pop('frequency', None)
+        if kwargs:
+            raise TypeError('transitionState() got unexpected keyword arguments {0!r}.'.format(list(kwargs)))
 
         ts.conformer = Conformer(E0=E0, modes=modes, spin_multiplicity=spin_multiplicity,
                                  optical_isomers=optical_isomers)
@@ -141,34 +135,16 @@ def transitionState(label, *args, **kwargs):
                 'The transition_state needs to reference a quantum job file or contain kinetic information.')
         raise InputError('The transition_state can only link a quantum job or directly input information, not both.')
 
-    if len(kwargs) > 0:
-        # The species parameters are given explicitly
-        protocol = 'UMVT'
-        E0 = None
-        rotors = None
-        imaginary_bonds = None
-        for key, value in kwargs.items():
-            if key == 'protocol':
-                protocol = value.upper()
-            elif key == 'E0':
-                E0 = value
-            elif key == 'rotors':
-                rotors = value
-            elif key == 'imaginary_bonds':
-                imaginary_bonds = value
-            else:
-                raise TypeError('species() got an unexpected keyword argument {0!r}.'.format(key))
-        
-        if protocol == 'UMVT' and rotors is None:
-            raise InputError('If the transition state is sampled by using UMVT algorithm, the rotors are needed to be specified.')
-               
-        job.protocol = protocol
-        ts.conformer.E0 = E0
-        job.rotors = rotors
-        job.imaginary_bonds = imaginary_bonds
-
     return ts
 
+@lru_cache(maxsize=None)
+def _resolve_species_tuple(labels):
+    """
+    Return the sorted tuple of the species with the given `labels`. The result is cached,
+    so this cache has to be cleared whenever `species_dict` is reset.
+    """
+    return tuple(sorted(species_dict[label] for label in labels))
+
 def reaction(label, reactants, products, transitionState=None, tunneling=''):
     """Load a reaction from an input file"""
     global reaction_dict, species_dict, transition_state_dict
@@ -177,8 +153,8 @@ def reaction(label, reactants, products, transitionState=None, tunneling=''):
         if label in reaction_dict:
             raise ValueError('Multiple occurrences of reaction with label {0!r}.'.format(label))
     logging.info('Loading reaction {0}...'.format(label))
-    reactants = sorted([species_dict[spec] for spec in reactants])
-    products = sorted([species_dict[spec] for spec in products])
+    reactants = list(_resolve_species_tuple(tuple(reactants)))
+    products = list(_resolve_species_tuple(tuple(products)))
     if transitionState:
         transitionState = transition_state_dict[transitionState]
     if transitionState and (tunneling == '' or tunneling is None):
@@ -199,14 +175,15 @@ def reaction(label, reactants, products, transitionState=None, tunneling=''):
 
 def thermo(label, Tlist=[298.15]):
     """Generate a thermo job"""
-    global job_list, species_dict
+    global job_list, species_dict, sampling_job_by_label
     try:
         spec = species_dict[label]
     except KeyError:
         raise ValueError('Unknown species label {0!r} for thermo() job.'.format(label))
-    for job in job_list:
-        if job.label == label:
-            input_file = job.input_file
+    try:
+        input_file = sampling_job_by_label[label].input_file
+    except KeyError:
+        raise InputError('The thermo() job of species {0!r} needs the species to reference a quantum output file.'.format(label))
     job = ThermoJob(label=label, input_file= input_file, output_directory=output_directory, Tlist=Tlist)
     job_list.append(job)
 
@@ -223,54 +200,70 @@ def kinetics(label, Tmin=None, Tmax=None, Tlist=None, Tcount=0, three_params=Tru
 
 ################################################################################
 
+_local_context_template = {
+    '__builtins__': None,
+    'True': True,
+    'False': False,
+    'range': range,
+    # Statistical mechanics
+    'IdealGasTranslation': IdealGasTranslation,
+    'LinearRotor': LinearRotor,
+    'NonlinearRotor': NonlinearRotor,
+    'KRotor': KRotor,
+    'SphericalTopRotor': SphericalTopRotor,
+    'HarmonicOscillator': HarmonicOscillator,
+    'HinderedRotor': HinderedRotor,
+    'FreeRotor': FreeRotor,
+    # Functions
+    'reaction': reaction,
+    'species': species,
+    'transitionState': transitionState,
+    # Jobs
+    'kinetics': kinetics,
+    'thermo': thermo,
+}
+
+
+@lru_cache(maxsize=64)
+def _compile_input(path, mtime):
+    """
+    Compile the input file located at `path` into a code object. The result is cached on
+    (`path`, `mtime`), so an unchanged input file is only tokenized and parsed once.
+    """
+    with open(path, 'r') as f:
+        return compile(f.read(), path, 'exec')
+
 
 def load_input_file(path, output_path=None):
     """
     Load the APE input file located at `path` on disk, and return a list of
     the jobs defined in that file.
     """
-    global species_dict, transition_state_dict, reaction_dict, job_list, directory, output_directory
+    global species_dict, transition_state_dict, reaction_dict, job_list, sampling_job_by_label, directory, output_directory
     directory = os.path.dirname(path)
     output_directory = output_path
     # Clear module-level variables
     species_dict, transition_state_dict, reaction_dict = dict(), dict(), dict()
     job_list = []
+    sampling_job_by_label = dict()
+    _resolve_species_tuple.cache_clear()
 
     global_context = {'__builtins__': None}
-    local_context = {
-        '__builtins__': None,
-        'True': True,
-        'False': False,
-        'range': range,
-        # Statistical mechanics
-        'IdealGasTranslation': IdealGasTranslation,
-        'LinearRotor': LinearRotor,
-        'NonlinearRotor': NonlinearRotor,
-        'KRotor': KRotor,
-        'SphericalTopRotor': SphericalTopRotor,
-        'HarmonicOscillator': HarmonicOscillator,
-        'HinderedRotor': HinderedRotor,
-        'FreeRotor': FreeRotor,
-        # Functions
-        'reaction': reaction,
-        'species': species,
-        'transitionState': transitionState,
-        # Jobs
-        'kinetics': kinetics,
-        'thermo': thermo,
-    }
+    local_context = dict(_local_context_template)
 
-    with open(path, 'r') as f:
-        try:
-            exec(f.read(), global_context, local_context)
-        except (NameError, TypeError, SyntaxError):
-            logging.error('The input file {0!r} was invalid:'.format(path))
-            raise
+    try:
+        code = _compile_input(path, os.path.getmtime(path))
+        exec(code, global_context, local_context)
+    except (NameError, TypeError, SyntaxError):
+        logging.error('The input file {0!r} was invalid:'.format(path))
+        raise
     
     gen_basis = local_context.get('gen_basis', "")
     thresh = local_context.get('cut_off_energy', 0.01)
     step_size_factor = local_context.get('step_size_factor', 1)
     nnl = local_context.get('number_of_natural_length', None)
+    # Number of modes sampled concurrently, either an integer or 'auto'
+    nworkers = local_context.get('number_of_sampling_workers', 1)
     # coordinate_system include "Normal Mode", "E-Optimized" and "E'-Optimized"
     coordinate_system = local_context.get('coordinate_system', 'Normal Mode')
     rem_variables_dict = {}
@@ -289,6 +282,7 @@ def load_input_file(path, output_path=None):
             job.step_size_factor = step_size_factor
             job.coordinate_system = coordinate_system
             job.nnl = nnl
+            job.nworkers = nworkers
         if isinstance(job, ThermoJob):
             job.coordinate_system = coordinate_system
             job.frequency_scale_factor = frequency_scale_factor
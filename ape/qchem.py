@@ -5,6 +5,7 @@ APE QChem module
 Used to parse QChem output files
 """
 
+import io
 import math
 import logging
 import os.path
@@ -32,9 +33,21 @@ class QChemLog(ESSAdapter):
 
     def __init__(self, path):
         self.path = path
+        self._content = None
+
+    def _open(self):
+        """
+        Return a file-like object over the content of the QChem output file.
+        The file is only read from disk once per QChemLog instance, so the
+        various loaders below share a single read instead of reopening it.
+        """
+        if self._content is None:
+            with open(self.path, 'r') as f:
+                self._content = f.read()
+        return io.StringIO(self._content)
 
     def job_is_finished(self):
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 # This marks the end of the thermochemistry section
@@ -45,7 +58,7 @@ class QChemLog(ESSAdapter):
 
     def is_unrestricted(self):
         is_unrestricted = False
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if line.startswith('$rem'):
@@ -68,7 +81,7 @@ class QChemLog(ESSAdapter):
         """
         is_QM_MM_INTERFACE = False
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if 'QM_MM_INTERFACE' in line.upper():
@@ -83,7 +96,7 @@ class QChemLog(ESSAdapter):
         """
         QM_atoms = []
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if '$QM_ATOMS' in line.upper():
@@ -103,7 +116,7 @@ class QChemLog(ESSAdapter):
         ISOTOPES = {}
         ISOTOPES_type = False
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if line.startswith('$rem'):
@@ -136,7 +149,7 @@ class QChemLog(ESSAdapter):
         """
         force_field_params = ''
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if '$force_field_params' in line:
@@ -154,7 +167,7 @@ class QChemLog(ESSAdapter):
         """
         opt = ''
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if '$opt' in line:
@@ -182,7 +195,7 @@ class QChemLog(ESSAdapter):
         fixed_molecule_string = ''
 
         n_atoms = len(self.get_QM_ATOMS())
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if '$MOLECULE' in line.upper():
@@ -205,7 +218,7 @@ class QChemLog(ESSAdapter):
         QM_USER_CONNECT = []
 
         n_atoms = len(self.get_QM_ATOMS())
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 if '$MOLECULE' in line.upper():
@@ -229,7 +242,7 @@ class QChemLog(ESSAdapter):
         """
         n_atoms = 0
 
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '' and n_atoms == 0:
                 # Automatically determine the number of atoms
@@ -259,7 +272,7 @@ class QChemLog(ESSAdapter):
         else:
             n_atoms = self.get_number_of_atoms()
         n_rows = n_atoms * 3
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 # Read force constant matrix
@@ -310,7 +323,7 @@ class QChemLog(ESSAdapter):
         """
         atom, coord, number, mass = [], [], [], []
 
-        with open(self.path) as f:
+        with self._open() as f:
             log = f.readlines()
 
         # First check that the QChem job file (not necessarily a geometry optimization)
@@ -410,7 +423,7 @@ class QChemLog(ESSAdapter):
                 optical_isomers = _optical_isomers
             if symmetry is None:
                 symmetry = _symmetry
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             line = f.readline()
             while line != '':
                 # Read spin multiplicity if not explicitly given
@@ -509,7 +522,7 @@ class QChemLog(ESSAdapter):
         the returned value.
         """
         e_elect = None
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             a = b = c = d = 0
             for line in f:
                 if 'CCSD(T) total energy' in line:
@@ -530,7 +543,7 @@ class QChemLog(ESSAdapter):
         Load the unscaled zero-point energy in J/mol from a QChem output file.
         """
         zpe = None
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             for line in f:
                 if 'Zero point vibrational energy:' in line:
                     zpe = float(line.split()[4]) * 4184  # QChem's ZPE is in kcal/mol, convert to J/mol
@@ -548,7 +561,7 @@ class QChemLog(ESSAdapter):
         v_list = []
         angle = []
         read = False
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             for line in f:
                 if '-----------------' in line:
                     read = False
@@ -581,7 +594,7 @@ class QChemLog(ESSAdapter):
         calculation in cm^-1.
         """
         frequency = 0
-        with open(self.path, 'r') as f:
+        with self._open() as f:
             for line in f:
                 # Read imaginary frequency
                 if ' Frequency:' in line:
@@ -4,8 +4,11 @@
 
 import os
 import csv
+import copy
 import logging
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial, wraps
 from time import gmtime, strftime
 
 import rmgpy.constants as constants
@@ -14,14 +17,96 @@ from rmgpy.statmech import HarmonicOscillator
 from arkane.common import symbol_by_number
 from arkane.statmech import is_linear
 
-from arc.species.species import ARCSpecies
-
 from ape.qchem import QChemLog
-from ape.common import diagonalize_projected_hessian, get_internal_rotation_freq, sampling_along_torsion, sampling_along_vibration
+from ape.common import diagonalize_projected_hessian, get_internal_rotation_freq, get_vibrational_mode_vectors, sampling_along_torsion, sampling_along_vibration
 from ape.InternalCoordinates import get_RedundantCoords, getXYZ
 from ape.OptimalVibrations import OptVib
 from ape.exceptions import InputError
 
+def _memoize(method):
+    # Cache the result of a QChemLog method called without arguments on the instance
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if args or kwargs:
+            return method(self, *args, **kwargs)
+        if method.__name__ not in self._memo:
+            self._memo[method.__name__] = method(self)
+        return self._memo[method.__name__]
+    return wrapper
+
+class _CachedLog(QChemLog):
+    """
+    A QChemLog whose argument-free loaders scan the output file only once.
+    The memoized results are shared by every caller, so copy them before modifying them in place.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._memo = {}
+
+    is_unrestricted = _memoize(QChemLog.is_unrestricted)
+    is_QM_MM_INTERFACE = _memoize(QChemLog.is_QM_MM_INTERFACE)
+    get_QM_ATOMS = _memoize(QChemLog.get_QM_ATOMS)
+    get_ISOTOPES = _memoize(QChemLog.get_ISOTOPES)
+    get_force_field_params = _memoize(QChemLog.get_force_field_params)
+    get_opt = _memoize(QChemLog.get_opt)
+    get_fixed_molecule = _memoize(QChemLog.get_fixed_molecule)
+    get_QM_USER_CONNECT = _memoize(QChemLog.get_QM_USER_CONNECT)
+    get_number_of_atoms = _memoize(QChemLog.get_number_of_atoms)
+    load_zero_point_energy = _memoize(QChemLog.load_zero_point_energy)
+    load_negative_frequency = _memoize(QChemLog.load_negative_frequency)
+    load_force_constant_matrix = _memoize(QChemLog.load_force_constant_matrix)
+    load_geometry = _memoize(QChemLog.load_geometry)
+    load_conformer = _memoize(QChemLog.load_conformer)
+
+# Sample index and electronic energy (in hartree, relative to the reference geometry) of a sampled point
+sample_dtype = np.dtype([('sample', np.int64), ('energy', np.float64)])
+
+
+@lru_cache(maxsize=32)
+def _load_qchem(path, mtime):
+    # `mtime` is only part of the cache key so that a rewritten output file is parsed again
+    return _CachedLog(path)
+
+def load_qchem(path):
+    """
+    Return the shared `_CachedLog` of the QChem output file located at `path`.
+    Each file is only read once per modification time, and each loader only parses it on first use.
+    """
+    path = os.path.abspath(path)
+    return _load_qchem(path, os.path.getmtime(path))
+
+def load_conformer(path):
+    """
+    Return a copy of the conformer of the QChem output file located at `path`.
+    Only the Hessian is left unparsed; the geometry is still loaded to determine the symmetry properties.
+    """
+    conformer, unscaled_frequencies = load_qchem(path).load_conformer()
+    return copy.deepcopy(conformer)
+
+def _xyz_key(xyz):
+    # Symbols and coordinates rounded to 1e-4 angstrom, so the same structure parsed twice gives the same key
+    symbols, coords = [], []
+    for line in xyz.splitlines():
+        symbol, x, y, z = line.split()
+        symbols.append(symbol)
+        coords.extend(round(float(i), 4) for i in (x, y, z))
+    return tuple(symbols), tuple(coords)
+
+@lru_cache(maxsize=64)
+def _determine_rotors(symbols, coords):
+    # ARC pulls in RDKit, so only import it once rotors actually have to be perceived
+    from arc.species.species import ARCSpecies
+    species = ARCSpecies(label='species', xyz=getXYZ(symbols, coords))
+    species.determine_rotors()
+    rotors_dict = {}
+    for i in species.rotors_dict:
+        rotors_dict[i + 1] = {}
+        rotors_dict[i + 1]['pivots'] = species.rotors_dict[i]['pivots']
+        rotors_dict[i + 1]['top'] = species.rotors_dict[i]['top']
+        rotors_dict[i + 1]['scan'] = species.rotors_dict[i]['scan']
+    return rotors_dict
+
 class SamplingJob(object):
     """
     The SamplingJob class.
@@ -29,7 +114,7 @@ class SamplingJob(object):
 
     def __init__(self, label=None, input_file=None, output_directory=None, protocol=None, spin_multiplicity=None, charge=None, 
                  rem_variables_dict={}, gen_basis="", ncpus=None, is_ts=None, imaginary_bonds=None, rotors=None, thresh=0.01,
-                 step_size_factor=1, coordinate_system='Normal Mode', nnl=None):
+                 step_size_factor=1, coordinate_system='Normal Mode', nnl=None, nworkers=1):
         self.label = label
         self.input_file = input_file
         self.output_directory = output_directory
@@ -46,21 +131,23 @@ class SamplingJob(object):
         self.step_size_factor = step_size_factor
         self.coordinate_system = coordinate_system
         self.nnl = nnl
+        self.nworkers = nworkers
 
     def parse(self, save_log=True):
         """
         Parse QChem output file and crate the variables the sampling job needed.
         """
-        Log = QChemLog(self.input_file)
+        Log = load_qchem(self.input_file)
 
         # Load force constant matrix
-        self.hessian = Log.load_force_constant_matrix()
+        self.hessian = Log.load_force_constant_matrix().copy()
 
         # Load cartesian coordinate
-        coordinates, number, mass = Log.load_geometry()
+        coordinates, number, mass = copy.deepcopy(Log.load_geometry())
 
         # Create conformer class
-        self.conformer, unscaled_frequencies = Log.load_conformer()
+        conformer, unscaled_frequencies = Log.load_conformer()
+        self.conformer = copy.deepcopy(conformer)
 
         # Define the sampling protocol
         if self.protocol is None:
@@ -90,25 +177,19 @@ class SamplingJob(object):
             self.opt = Log.get_opt()
             self.fixed_molecule_string = Log.get_fixed_molecule()
             self.QM_USER_CONNECT = Log.get_QM_USER_CONNECT()
-            self.QM_mass = Log.QM_mass
-            self.QM_coord = Log.QM_coord
+            self.QM_mass = Log.QM_mass.copy()
+            self.QM_coord = Log.QM_coord.copy()
             self.natom =  len(self.QM_ATOMS) + len(self.ISOTOPES)
             self.symbols = Log.QM_atom
             self.cart_coords = self.QM_coord.reshape(-1,)
             self.conformer.coordinates = (self.QM_coord, "angstroms")
             self.conformer.mass = (self.QM_mass, "amu")
-            xyz = ''
-            self.natoms_adsorbate = 0
+            xyz_lines = []
             for i in range(len(self.QM_ATOMS)):
                 if self.QM_USER_CONNECT[i].endswith('0  0  0  0'):
-                    xyz += '{}\t{}\t\t{}\t\t{}'.format(self.symbols[i], self.cart_coords[3 * i], self.cart_coords[3 * i + 1], self.cart_coords[3 * i + 2])
-                    self.natoms_adsorbate += 1
-                    if i != self.natom-1: xyz += '\n'
-            self.xyz = xyz
-            if self.xyz == '':
-                self.ARCSpecies = None
-            else:
-                self.ARCSpecies = ARCSpecies(label=self.label, xyz=self.xyz)
+                    xyz_lines.append('{}\t{}\t\t{}\t\t{}'.format(self.symbols[i], self.cart_coords[3 * i], self.cart_coords[3 * i + 1], self.cart_coords[3 * i + 2]))
+            self.natoms_adsorbate = len(xyz_lines)
+            self.xyz = '\n'.join(xyz_lines)
             if self.ncpus is None:
                 # Default ncpus for QM/MM calculation
                 self.ncpus = 8
@@ -123,9 +204,8 @@ class SamplingJob(object):
             self.conformer.number = number
             self.conformer.mass = (mass, "amu")            
             self.xyz = getXYZ(self.symbols, self.cart_coords)
-            self.ARCSpecies = ARCSpecies(label=self.label, xyz=self.xyz)
             if self.ncpus is None:
-                self.ncpus = self.ARCSpecies.number_of_heavy_atoms
+                self.ncpus = len([symbol for symbol in self.symbols if symbol != 'H'])
                 if self.ncpus > 8: self.ncpus = 8
             self.zpe = Log.load_zero_point_energy()
 
@@ -157,6 +237,8 @@ class SamplingJob(object):
 
         # Create RedundantCoords object
         self.internal = get_RedundantCoords(self.label, self.symbols, self.cart_coords, nHcap=self.nHcap, natoms_adsorbate=self.natoms_adsorbate, imaginary_bonds=self.imaginary_bonds, save_log=save_log)
+        # RedundantCoords.B is rebuilt from the primitive internals on every access, so keep a contiguous snapshot
+        self._B = np.ascontiguousarray(self.internal.B)
         
         # Create RedundantCoords object for torsional mode
         if self.protocol == 'UMVT':
@@ -172,26 +254,41 @@ class SamplingJob(object):
         else:
             self.max_nloop = 200
 
+        # Collect the arguments shared by every sampling_along_torsion and sampling_along_vibration call
+        self._sampler_kwargs = dict(symbols=self.symbols, cart_coords=self.cart_coords, ncpus=self.ncpus, charge=self.charge,
+                                    multiplicity=self.spin_multiplicity, rem_variables_dict=self.rem_variables_dict, gen_basis=self.gen_basis)
+        if self.is_QM_MM_INTERFACE:
+            self._sampler_kwargs.update(is_QM_MM_INTERFACE=self.is_QM_MM_INTERFACE, QM_USER_CONNECT=self.QM_USER_CONNECT, QM_ATOMS=self.QM_ATOMS,
+                                        force_field_params=self.force_field_params, fixed_molecule_string=self.fixed_molecule_string, opt=self.opt,
+                                        number_of_fixed_atoms=self.number_of_fixed_atoms)
+
     def get_rotors_dict(self):
         """
         Determine possible unique rotors in the species to be treated as hindered rotors,
         taking into account all localized structures.
         The resulting rotors are saved in {'pivots': [1, 3], 'top': [3, 7], 'scan': [2, 1, 3, 7]} format.
         """
-        rotors_dict = {}
-        species = self.ARCSpecies
-        if species is None:
-            return rotors_dict
-        species.determine_rotors()
-        for i in species.rotors_dict:
-            rotors_dict[i + 1] = {}
-            pivots = species.rotors_dict[i]['pivots']
-            top = species.rotors_dict[i]['top']
-            scan = species.rotors_dict[i]['scan']
-            rotors_dict[i + 1]['pivots'] = pivots 
-            rotors_dict[i + 1]['top'] = top
-            rotors_dict[i + 1]['scan'] = scan
-        return rotors_dict
+        if self.xyz == '':
+            return {}
+        # Rotor perception only depends on the geometry, so reuse the result of an identical structure
+        return copy.deepcopy(_determine_rotors(*_xyz_key(self.xyz)))
+
+    def get_nworkers(self):
+        """
+        Return the number of modes to be sampled concurrently. By default the modes are sampled one at a time.
+        If `nworkers` is 'auto', the CPUs available to this process are shared among QChem calculations of `ncpus` each.
+        """
+        if self.nworkers != 'auto':
+            try:
+                return max(1, int(self.nworkers or 1))
+            except (TypeError, ValueError):
+                raise InputError('The number_of_sampling_workers should be an integer or auto, got {0!r}.'.format(self.nworkers))
+        try:
+            available_cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            # os.sched_getaffinity is not available on every platform
+            available_cpus = os.cpu_count() or 1
+        return max(1, available_cpus // max(1, self.ncpus or 1))
 
     def sampling(self, thresh=0.01, save_result=True, scan_res=10):
         """
@@ -200,12 +297,17 @@ class SamplingJob(object):
         the energy rises more than 0.01 hartree (i.e., about 26 kJ/mol) compared with the reference stationary point. 
         The sampling of UM-VT was terminated when the torsional angle has been displaced by 2π.
         The energy cutoff energy could be changed by defining the value of thresh.
+        Rotors given in the input file may also specify their torsional symmetry number, e.g. 'symmetry': 3,
+        in which case only the first period of the torsional scan is calculated.
         The dictionary of sampling geometries, calculated energies and mode information will be returned.
+        The energies of each mode are stored in an array of `sample_dtype` sorted by sample index,
+        and the geometries in a dictionary keyed by sample index in the same order.
         """
         logging.info('Sampling {}...'.format(self.label))
         xyz_dict = {}
         energy_dict = {}
         mode_dict = {}
+        sampling_tasks = {}
         if not os.path.exists(self.output_directory):
             os.makedirs(self.output_directory)
         path = os.path.join(self.output_directory, 'output_file', self.label)
@@ -219,21 +321,14 @@ class SamplingJob(object):
             vib_freq, unweighted_v = diagonalize_projected_hessian(self.conformer, self.hessian, self.linearity, self.n_vib, rotors, label=self.label)
             logging.debug('\nFrequencies(cm-1) from projected Hessian: {}'.format(vib_freq))
             
-            # Sample points along the 1-D PES of each torsion motion
+            # Prepare the sampling of points along the 1-D PES of each torsion motion
             for i in range(self.n_rotors):
                 mode = i + 1
                 target_rotor = rotors[i]
                 int_freq = get_internal_rotation_freq(self.conformer, self.hessian, target_rotor, rotors, self.linearity, self.n_vib, is_QM_MM_INTERFACE=self.is_QM_MM_INTERFACE, label=self.label)
-                if self.is_QM_MM_INTERFACE:
-                    XyzDictOfEachMode, EnergyDictOfEachMode, ModeDictOfEachMode, min_elect = sampling_along_torsion(self.symbols, self.cart_coords, mode, self.torsion_internal, self.conformer,
-                    int_freq, self.rotors_dict, scan_res, path, self.ncpus, self.charge, self.spin_multiplicity, self.rem_variables_dict, self.gen_basis, self.is_QM_MM_INTERFACE, 
-                    self.QM_USER_CONNECT, self.QM_ATOMS, self.force_field_params, self.fixed_molecule_string, self.opt, self.number_of_fixed_atoms, self.label)
-                else:
-                    XyzDictOfEachMode, EnergyDictOfEachMode, ModeDictOfEachMode, min_elect = sampling_along_torsion(self.symbols, self.cart_coords, mode, self.torsion_internal, self.conformer,
-                    int_freq, self.rotors_dict, scan_res, path, self.ncpus, self.charge, self.spin_multiplicity, self.rem_variables_dict, self.gen_basis, label=self.label)
-                xyz_dict[mode] = XyzDictOfEachMode
-                energy_dict[mode] = EnergyDictOfEachMode
-                mode_dict[mode] = ModeDictOfEachMode
+                sampling_tasks[mode] = partial(sampling_along_torsion, mode=mode, internal_object=self.torsion_internal, conformer=self.conformer, int_freq=int_freq,
+                                               rotors_dict=self.rotors_dict, scan_res=scan_res, path=path, label=self.label,
+                                               symmetry_number=self.rotors_dict[mode].get('symmetry'), **self._sampler_kwargs)
         
         elif self.protocol == 'UMN' or self.n_rotors == 0:
             logging.info(self.internal.get_intco_log())
@@ -254,41 +349,53 @@ class SamplingJob(object):
                 os.makedirs(optvib_path)
             vib_freq, unweighted_v = optvib.get_optvib()
 
-        # Sample points along the 1-D PES of each vibration motion
-        for i in range(self.nmode):
-            if i in range(self.n_rotors): continue
+        # Determine the reduced mass, step size and directional vector in internal coordinates of all vibrational modes at once
+        new_nHcap = self.internal.nHcap - self.nHcap if self.internal.nHcap is not None else 0
+        reduced_masses, step_sizes, qj_all = get_vibrational_mode_vectors(vib_freq, unweighted_v, self._B, new_nHcap, self.step_size_factor)
+
+        # Prepare the sampling of points along the 1-D PES of each vibration motion
+        n_rotors = self.n_rotors
+        for i in range(n_rotors, self.nmode):
             mode = i + 1
-            vector = unweighted_v[i - self.n_rotors]
-            freq = vib_freq[i - self.n_rotors]
-            magnitude = np.linalg.norm(vector)
-            reduced_mass = magnitude ** -2 / constants.amu # in amu
-            step_size = np.sqrt(constants.hbar / (reduced_mass * constants.amu) / (freq * 2 * np.pi * constants.c * 100)) * 10 ** 10 * self.step_size_factor # in angstrom
-            normalizes_vector = vector / magnitude
-            if self.internal.nHcap is not None:
-                new_nHcap = self.internal.nHcap - self.nHcap
-                normalizes_vector = np.concatenate((normalizes_vector, [0, 0, 0] * new_nHcap), axis=None)
-            qj = np.matmul(self.internal.B, normalizes_vector)
-            qj = qj.reshape(-1,)
-            if self.is_QM_MM_INTERFACE:
-                XyzDictOfEachMode, EnergyDictOfEachMode, ModeDictOfEachMode, min_elect = sampling_along_vibration(self.symbols, self.cart_coords, mode, self.internal, qj, freq, reduced_mass,
-                step_size, path, thresh, self.ncpus, self.charge, self.spin_multiplicity, self.rem_variables_dict, self.gen_basis, self.is_QM_MM_INTERFACE,
-                self.QM_USER_CONNECT, self.QM_ATOMS, self.force_field_params, self.fixed_molecule_string, self.opt, self.number_of_fixed_atoms, max_nloop=self.max_nloop)
-            else:
-                XyzDictOfEachMode, EnergyDictOfEachMode, ModeDictOfEachMode, min_elect = sampling_along_vibration(self.symbols, self.cart_coords, mode, self.internal, qj, freq, reduced_mass, step_size,
-                path, thresh, self.ncpus, self.charge, self.spin_multiplicity, self.rem_variables_dict, self.gen_basis, max_nloop=self.max_nloop)
-            xyz_dict[mode] = XyzDictOfEachMode
-            energy_dict[mode] = EnergyDictOfEachMode
-            mode_dict[mode] = ModeDictOfEachMode
+            freq = vib_freq[i - n_rotors]
+            reduced_mass = reduced_masses[i - n_rotors]
+            step_size = step_sizes[i - n_rotors]
+            qj = qj_all[:, i - n_rotors]
+            sampling_tasks[mode] = partial(sampling_along_vibration, mode=mode, internal_object=self.internal, internal_vector=qj, freq=freq, reduced_mass=reduced_mass,
+                                           step_size=step_size, path=path, thresh=thresh, max_nloop=self.max_nloop, **self._sampler_kwargs)
+
+        # The modes are independent of each other, so up to `nworkers` of them can be sampled concurrently
+        results = {}
+        nworkers = self.get_nworkers()
+        if nworkers == 1:
+            for mode in sorted(sampling_tasks):
+                results[mode] = sampling_tasks[mode]()
+        else:
+            with ThreadPoolExecutor(max_workers=nworkers) as executor:
+                futures = {executor.submit(task): mode for mode, task in sorted(sampling_tasks.items())}
+                try:
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                finally:
+                    # Do not start the QChem calculations of the remaining modes once one mode fails or the run is interrupted
+                    for future in futures:
+                        future.cancel()
+        min_elect_list = []
+        for mode in sorted(results):
+            XyzDictOfEachMode, EnergyDictOfEachMode, mode_dict[mode], min_elect = results[mode]
+            min_elect_list.append(min_elect)
+            # Store the sampled points of each mode as arrays sorted by sample index rather than nested dicts,
+            # so the writers below can use this order directly
+            energy_dict[mode] = np.sort(np.array(list(EnergyDictOfEachMode.items()), dtype=sample_dtype), order='sample')
+            xyz_dict[mode] = {sample: XyzDictOfEachMode[sample] for sample in energy_dict[mode]['sample'].tolist()}
 
         # Add the ground-state energy (including zero-point energy) of the conformer
         # Convert the unit from hartree/particle to J/mol
-        self.e_elect = min_elect
+        self.e_elect = min(min_elect_list)
         e0 = self.e_elect * constants.E_h * constants.Na + self.zpe
         self.conformer.E0 = (e0, "J/mol")
 
         if save_result:
-            if os.path.exists(self.csv_path):
-                os.remove(self.csv_path)
             self.write_samping_result_to_csv_file(self.csv_path, mode_dict, energy_dict)
 
             path = os.path.join(self.output_directory, 'sampling', self.label)
@@ -299,47 +406,37 @@ class SamplingJob(object):
         return xyz_dict, energy_dict, mode_dict
 
     def write_samping_result_to_csv_file(self, csv_path, mode_dict, energy_dict):
-        write_min_elect = False
-        if os.path.exists(csv_path) is False:
-            write_min_elect = True
-
-        with open(csv_path, 'a') as f:
+        with open(csv_path, 'w', buffering=1 << 20, newline='') as f:
             writer = csv.writer(f)
-            if write_min_elect:
-                writer.writerow(['min_elect', self.e_elect])
-            for mode in mode_dict.keys():
+            writerow = writer.writerow
+            writerow(['min_elect', self.e_elect])
+            for mode in sorted(mode_dict):
                 if mode_dict[mode]['mode'] == 'tors':
                     is_tors = True
                     name = 'mode_{}_tors'.format(mode)
                 else:
                     is_tors = False
                     name = 'mode_{}_vib'.format(mode)
-                writer.writerow([name])
+                writerow([name])
                 if is_tors:
-                    writer.writerow(['symmetry_number', mode_dict[mode]['symmetry_number']])
-                writer.writerow(['M', mode_dict[mode]['M']])
-                writer.writerow(['K', mode_dict[mode]['K']])
-                writer.writerow(['step_size', mode_dict[mode]['step_size']])
-                writer.writerow(['sample', 'total energy(HARTREE)'])
-                for sample in sorted(energy_dict[mode].keys()):
-                    writer.writerow([sample, energy_dict[mode][sample]])
-            f.close()
+                    writerow(['symmetry_number', mode_dict[mode]['symmetry_number']])
+                writerow(['M', mode_dict[mode]['M']])
+                writerow(['K', mode_dict[mode]['K']])
+                writerow(['step_size', mode_dict[mode]['step_size']])
+                writerow(['sample', 'total energy(HARTREE)'])
+                writer.writerows(energy_dict[mode].tolist())
             # logging.debug('Have saved the sampling result in {path}'.format(path=csv_path))
     
     def write_sampling_displaced_geometries(self, path, energy_dict, xyz_dict):
         # creat a format can be read by VMD software
         for mode in energy_dict.keys():
             txt_path = os.path.join(path, 'mode_{}.txt'.format(mode))
-            with open(txt_path, 'w') as f:
-                for sample in sorted(energy_dict[mode].keys()): 
-                    content = record_script.format(natom=self.natom, sample=sample, e_elect=energy_dict[mode][sample], xyz=xyz_dict[mode][sample])
-                    f.write(content)
-                current_time = strftime("%Y-%m-%d %H:%M:%S", gmtime())
-                f.write('\n    This sampling was finished on:   {time}'.format(time=current_time))
-                f.write("""\n=------------------------------------------------------------------------------=""")
-                f.write("""\nSampling finished.""")
-                f.write("""\n=------------------------------------------------------------------------------=""")
-                f.close()
+            records = [record_script.format(natom=self.natom, sample=sample, e_elect=e_elect, xyz=xyz_dict[mode][sample])
+                       for sample, e_elect in energy_dict[mode].tolist()]
+            current_time = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+            records.append(record_footer.format(time=current_time))
+            with open(txt_path, 'w', buffering=1 << 20) as f:
+                f.write(''.join(records))
 
     def execute(self):
         """
@@ -356,3 +453,9 @@ record_script ='''{natom}
 # Point {sample} Energy = {e_elect}
 {xyz}
 '''
+
+record_footer = '''
+    This sampling was finished on:   {time}
+=------------------------------------------------------------------------------=
+Sampling finished.
+=------------------------------------------------------------------------------='''